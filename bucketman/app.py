@@ -1,9 +1,12 @@
 import os
 import pathlib
 import shutil
+import typing
 
 import boto3
+import botocore.config
 import botocore.exceptions
+import textual.actions
 import textual.app
 import textual.binding
 import textual.notifications
@@ -11,10 +14,26 @@ import textual.containers
 import textual.screen
 import textual.widgets
 
-from bucketman.constants import AWS_HEX_COLOR_CODE
-from bucketman.modals import BucketSelectScreen, ConfirmationScreen
+from bucketman.backends import AsyncBackend, ThreadedBackend
+from bucketman.batch import ObjectChanges, drop_nested_paths, error_message, iter_upload_targets
+from bucketman.constants import (
+    AWS_HEX_COLOR_CODE,
+    DETAILS_CACHE_SIZE,
+    MAX_CONCURRENT_TRANSFERS,
+    MULTIPART_CONCURRENCY,
+)
+from bucketman.modals import (
+    BucketSelectScreen,
+    ConfirmationScreen,
+    EditObjectsScreen,
+    ObjectDetailsScreen,
+    ProgressScreen,
+    VersionsScreen,
+)
+from bucketman.utils import LRUCache, format_size
 from bucketman.widgets import (
     LocalTree,
+    S3Object,
     S3Tree,
 )
 from bucketman.widgets.common import ObjectType
@@ -24,7 +43,8 @@ class BucketManApp(textual.app.App):
     SUB_TITLE = "A Terminal S3 File Browser, 🔨 with 💗 by brennerm"
     CSS_PATH = "bucketman.tcss"
     BINDINGS = [
-            textual.binding.Binding("escape,q,ctrl+c", "quit", "Quit", show=True, key_display="ESC", priority=True),
+            textual.binding.Binding("escape,q", "quit_unless_modal", "Quit", show=True, key_display="ESC", priority=True),
+            textual.binding.Binding("ctrl+c", "quit", "Quit", show=False, priority=True),
         ]
     ENABLE_COMMAND_PALETTE = False
 
@@ -36,6 +56,7 @@ class BucketManApp(textual.app.App):
         access_key_id: str = None,
         secret_access_key: str = None,
         dry_run: bool = False,
+        backend: str = "threaded",
         **kwargs,
     ):
 
@@ -47,19 +68,38 @@ class BucketManApp(textual.app.App):
             aws_secret_access_key=secret_access_key,
         )
 
-        self.s3_client = session.client("s3", endpoint_url=endpoint_url)
-        self.s3_resource = session.resource("s3", endpoint_url=endpoint_url)
+        # every transfer thread of the pool may run MULTIPART_CONCURRENCY requests, give each one a connection
+        self.s3_client = session.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            config=botocore.config.Config(max_pool_connections=MAX_CONCURRENT_TRANSFERS * MULTIPART_CONCURRENCY),
+        )
+
+        if backend == "async":
+            self.backend = AsyncBackend(access_key_id, secret_access_key, endpoint_url)
+        else:
+            self.backend = ThreadedBackend(self.s3_client)
+        # maps (bucket, key) to the ETag, HEAD and ACL response shown on the details screen
+        self.details_cache = LRUCache(DETAILS_CACHE_SIZE)
 
         self.footer = textual.widgets.Footer()
         self.header = textual.widgets.Header()
 
         super().__init__(*args, **kwargs)
 
+    @property
+    def local_tree(self) -> LocalTree:
+        return self.query_one('#left LocalTree', LocalTree)
+
+    @property
+    def s3_tree(self) -> S3Tree:
+        return self.query_one('#right S3Tree', S3Tree)
+
     @property
     def selected_local_folder(self) -> pathlib.PosixPath:
         """Return the selected local folder. If a file is selected, return the parent folder."""
 
-        selected_node = self.query_one('#left LocalTree', LocalTree).cursor_node
+        selected_node = self.local_tree.cursor_node
         if selected_node.allow_expand:
             return selected_node.data.path
         else:
@@ -68,198 +108,343 @@ class BucketManApp(textual.app.App):
     @property
     def selected_local_object(self) -> pathlib.PosixPath:
         """Return the selected local folder or file."""
-        selected_node = self.query_one('#left LocalTree', LocalTree).cursor_node
+        selected_node = self.local_tree.cursor_node
         return selected_node.data.path
 
+    @property
+    def selected_local_objects(self) -> typing.List[pathlib.PosixPath]:
+        """Return the marked local folders and files. If nothing is marked, return the selected one."""
+        marked = [entry.path for entry in self.local_tree.marked]
+        return marked if marked else [self.selected_local_object]
+
     @property
     def selected_s3_key_or_prefix(self):
         """Return the selected S3 key or prefix."""
-        selected_node = self.query_one('#right S3Tree', S3Tree).cursor_node
+        selected_node = self.s3_tree.cursor_node
         return selected_node.data.key
 
+    @property
+    def selected_s3_objects(self) -> typing.List[S3Object]:
+        """Return the marked S3 objects and prefixes. If nothing is marked, return the selected one."""
+        marked = self.s3_tree.marked
+        return marked if marked else [self.s3_tree.cursor_node.data]
+
     @property
     def selected_s3_prefix(self):
         """Return the selected S3 prefix. If an object is selected, return the parent prefix."""
-        selected_node = self.query_one('#right S3Tree', S3Tree).cursor_node
+        selected_node = self.s3_tree.cursor_node
         if selected_node.allow_expand:
             return selected_node.data.key
         else:
             return selected_node.parent.data.key
 
+    def action_quit_unless_modal(self) -> None:
+        """Quit the app, unless a modal screen is shown. Modal screens handle escape themselves and q may be typed into their inputs."""
+        if isinstance(self.screen, textual.screen.ModalScreen):
+            raise textual.actions.SkipAction()
+        self.exit()
+
     def action_download(self) -> None:
-        """Download the selected object to the selected local folder after confirmation."""
+        """Download the selected or marked objects to the selected local folder after confirmation."""
         bucket = self.bucket_name
-        key = self.selected_s3_key_or_prefix
+        s3_objects = self.selected_s3_objects
         path = str(self.selected_local_folder)
 
         def check_download(do_download: bool) -> None:
             if not do_download:
                 return
 
-            self.run_worker(self.do_download(self.bucket_name, key, path), thread=True)
+            self.s3_tree.clear_marks()
+            self.run_worker(self.do_download(bucket, s3_objects, path))
 
-        self.push_screen(
-            ConfirmationScreen(
-                prompt=f"Do you want to download the object {bucket}/{key} to {path}?",
-            ),
-            check_download
-        )
+        if len(s3_objects) == 1:
+            prompt = f"Do you want to download the object {bucket}/{s3_objects[0].key} to {path}?"
+        else:
+            prompt = f"Do you want to download {len(s3_objects)} marked objects from {bucket} to {path}?"
 
-    async def do_download(self, bucket, key, path) -> None:
-        """Download the given S3 object to the given local folder."""
-        target_path = os.path.join(path, os.path.basename(key))
+        self.push_screen(ConfirmationScreen(prompt=prompt), check_download)
+
+    async def do_download(self, bucket: str, s3_objects: typing.List[S3Object], path: str) -> None:
+        """Download the given S3 objects and prefixes to the given local folder in parallel."""
+        try:
+            targets = await self.backend.list_download_targets(bucket, s3_objects, path)
+        except botocore.exceptions.ClientError as e:
+            self.notify(
+                f'Failed to list objects to download from {bucket}: {e.response["Error"]["Message"]}',
+                title='Error',
+                severity='error'
+            )
+            return
 
         if self.dry_run:
-            self.notify(f'Would download {bucket}/{key} to {target_path}', title='Dry Run')
+            if len(targets) == 1:
+                self.notify(f'Would download {bucket}/{targets[0][0]} to {targets[0][1]}', title='Dry Run')
+            else:
+                self.notify(f'Would download {len(targets)} objects from {bucket} to {path}', title='Dry Run')
             return
 
-        try:
-            self.s3_client.download_file(bucket, key, target_path)
-        except botocore.exceptions.ClientError as e:
+        failures = await self.backend.download_files(bucket, targets)
+        for (key, target_path), e in failures:
             self.notify(
-                f'Failed to download object {bucket}/{key} to {target_path}: {e.response["Error"]["Message"]}',
+                f'Failed to download object {bucket}/{key} to {target_path}: {error_message(e)}',
                 title='Error',
                 severity='error'
             )
-        else:
-            self.query_one('#left LocalTree', LocalTree).reload_selected_directory()
 
+        self.local_tree.reload_selected_directory()
+        if len(targets) > len(failures):
             self.notify(
-                f'Successfully downloaded object {bucket}/{key} to {target_path}',
+                f'Successfully downloaded {len(targets) - len(failures)} object(s) from {bucket} to {path}',
                 title='Success',
             )
 
-    def action_upload(self, path_to_upload: str=None) -> None:
-        """Upload the selected (or given) local folder/file to the selected S3 prefix after confirmation."""
+    def action_upload(self, paths_to_upload: typing.List[str]=None) -> None:
+        """Upload the selected, marked (or given) local folders/files to the selected S3 prefix after confirmation.
+
+        The files to upload and their total size are collected in the background before asking for confirmation.
+        """
 
         bucket = self.bucket_name
-        path = path_to_upload if path_to_upload else str(self.selected_local_object)
+        paths = paths_to_upload if paths_to_upload else [str(path) for path in self.selected_local_objects]
         key = self.selected_s3_prefix
 
+        self.notify(f'Collecting files to upload to {bucket}/{key}...')
+        self.run_worker(self.scan_upload(paths, bucket, key, clear_marks=not paths_to_upload), thread=True)
+
+    async def scan_upload(self, paths: typing.List[str], bucket: str, key: str, clear_marks: bool) -> None:
+        """Collect the files below the given local folders/files and ask for confirmation to upload them."""
+        try:
+            targets = list(iter_upload_targets(paths, key))
+            total_size = sum(os.path.getsize(path) for path, _ in targets)
+        except OSError as e:
+            self.notify(f'Failed to collect files to upload: {error_message(e)}', title='Error', severity='error')
+            return
+
         def check_upload(do_upload: bool) -> None:
             if not do_upload:
                 return
 
-            self.run_worker(self.do_upload(path, bucket, key), thread=True)
+            if clear_marks:
+                self.local_tree.clear_marks()
+            self.run_worker(self.do_upload(targets, bucket, key))
 
-        self.push_screen(
-            ConfirmationScreen(
-                prompt=f"Do you want to upload the path {path} to {bucket}/{key}?",
-            ),
-            check_upload
-        )
+        if len(paths) == 1:
+            prompt = f"Do you want to upload the path {paths[0]} ({len(targets)} file(s), {format_size(total_size)}) to {bucket}/{key}?"
+        else:
+            prompt = f"Do you want to upload {len(paths)} paths ({len(targets)} file(s), {format_size(total_size)}) to {bucket}/{key}?"
 
-    async def do_upload(self, path, bucket, key) -> None:
-        """Upload the given local folder/file to the given S3 prefix."""
-        target_path = os.path.join(key, os.path.basename(path))
+        self.call_from_thread(self.push_screen, ConfirmationScreen(prompt=prompt), check_upload)
 
+    async def do_upload(self, targets: typing.List[typing.Tuple[str, str]], bucket: str, key: str) -> None:
+        """Upload the given (local file, key) pairs in parallel. Large files are streamed using multipart uploads."""
         if self.dry_run:
-            self.notify(f'Would upload {path} to {bucket}/{target_path}', title='Dry Run')
+            if len(targets) == 1:
+                self.notify(f'Would upload {targets[0][0]} to {bucket}/{targets[0][1]}', title='Dry Run')
+            else:
+                self.notify(f'Would upload {len(targets)} files to {bucket}/{key}', title='Dry Run')
             return
 
-        try:
-            if os.path.isdir(path):
-                for root, dirs, files in os.walk(path):
-                    for file in files:
-                        src = os.path.join(root, file)
-                        dst = os.path.normpath(
-                            os.path.join(target_path, os.path.relpath(root, path), file)
-                        )
-                        self.s3_client.upload_file(src, bucket, dst)
-            else:
-                self.s3_client.upload_file(path, bucket, target_path)
-        except botocore.exceptions.ClientError as e:
+        failures = await self.backend.upload_files(bucket, targets)
+        for (path, target_path), e in failures:
             self.notify(
-                f'Failed to upload file {path} to {bucket}/{target_path}: {e.response["Error"]["Message"]}',
+                f'Failed to upload file {path} to {bucket}/{target_path}: {error_message(e)}',
                 title='Error',
                 severity='error'
             )
-        else:
-            self.query_one('#right S3Tree', S3Tree).reload_selected_prefix()
+
+        self.s3_tree.reload_selected_prefix()
+        if len(targets) > len(failures):
             self.notify(
-                f'Successfully uploaded path {path} to {bucket}/{target_path}',
+                f'Successfully uploaded {len(targets) - len(failures)} file(s) to {bucket}/{key}',
                 title='Success',
             )
 
     def action_local_delete(self) -> None:
-        """Delete the selected local file or folder after confirmation."""
-        path = str(self.selected_local_object.absolute())
+        """Delete the selected or marked local files and folders after confirmation."""
+        # deleting a folder already deletes the selected paths below it
+        paths = drop_nested_paths(str(path.absolute()) for path in self.selected_local_objects)
 
         def check_delete(do_delete: bool) -> None:
             if not do_delete:
                 return
 
-            self.run_worker(self.do_local_delete(path), thread=True)
+            self.local_tree.clear_marks()
+            self.run_worker(self.do_local_delete(paths), thread=True)
 
-        self.push_screen(
-            ConfirmationScreen(
-                prompt=f"Do you want to delete the path {path}?",
-            ),
-            check_delete
-        )
+        if len(paths) == 1:
+            prompt = f"Do you want to delete the path {paths[0]}?"
+        else:
+            prompt = f"Do you want to delete {len(paths)} marked paths?"
+
+        self.push_screen(ConfirmationScreen(prompt=prompt), check_delete)
 
-    async def do_local_delete(self, path: str) -> None:
-        """Delete the given local file or folder."""
+    async def do_local_delete(self, paths: typing.List[str]) -> None:
+        """Delete the given local files and folders."""
         if self.dry_run:
-            self.notify(f'Would delete {path}', title='Dry Run')
+            self.notify(f'Would delete {", ".join(paths)}', title='Dry Run')
             return
 
-        try:
-            if os.path.isfile(path):
-                os.remove(path)
+        deleted = 0
+        for path in paths:
+            try:
+                if os.path.isfile(path):
+                    os.remove(path)
+                else:
+                    shutil.rmtree(path)
+            except OSError as e:
+                self.notify(
+                    f'Failed to delete path "{path}": {e.strerror}',
+                    title='Error',
+                    severity='error'
+                )
             else:
-                shutil.rmtree(path)
-        except OSError as e:
-            self.notify(
-                f'Failed to delete path "{path}": {e.strerror}',
-                title='Error',
-                severity='error'
-            )
-        else:
+                deleted += 1
+
+        if deleted:
             self.notify(
-                f'Successfully deleted path "{path}"',
+                f'Successfully deleted path "{paths[0]}"' if len(paths) == 1 else f'Successfully deleted {deleted} path(s)',
                 title='Success',
             )
-            self.query_one('#left LocalTree', LocalTree).reload_parent_of_selected_node()
+        self.call_from_thread(self.local_tree.reload_parents, [pathlib.Path(path) for path in paths])
 
     def action_s3_delete(self) -> None:
-        """Delete the selected S3 object or prefix after confirmation."""
+        """Delete the selected or marked S3 objects and prefixes after confirmation."""
         bucket = self.bucket_name
-        key_or_prefix = self.selected_s3_key_or_prefix
+        s3_objects = self.selected_s3_objects
 
         def check_delete(do_delete: bool) -> None:
             if not do_delete:
                 return
 
-            self.run_worker(self.do_s3_delete(bucket, key_or_prefix), thread=True)
+            self.s3_tree.clear_marks()
+            self.run_worker(self.do_s3_delete(bucket, s3_objects))
+
+        if len(s3_objects) == 1:
+            prompt = f"Do you want to delete the object {bucket}/{s3_objects[0].key}?"
+        else:
+            prompt = f"Do you want to delete {len(s3_objects)} marked objects from {bucket}?"
+
+        self.push_screen(ConfirmationScreen(prompt=prompt), check_delete)
+
+    async def do_s3_delete(self, bucket: str, s3_objects: typing.List[S3Object]) -> None:
+        """Delete the given S3 objects and prefixes using batched DeleteObjects requests."""
+        if self.dry_run:
+            keys = ", ".join(f'{bucket}/{s3_object.key}' for s3_object in s3_objects)
+            self.notify(f'Would delete {keys}', title='Dry Run')
+            return
+
+        try:
+            deleted, errors = await self.backend.delete(bucket, s3_objects)
+        except botocore.exceptions.ClientError as e:
+            self.notify(
+                f'Failed to delete S3 object(s) in "{bucket}": {e.response["Error"]["Message"]}',
+                title='Error',
+                severity='error'
+            )
+            return
+
+        for error in errors:
+            self.notify(
+                f'Failed to delete S3 object "{bucket}/{error["Key"]}": {error["Message"]}',
+                title='Error',
+                severity='error'
+            )
+        if deleted:
+            self.notify(
+                f'Successfully deleted {deleted} S3 object(s) in "{bucket}"',
+                title='Success',
+            )
+        self.s3_tree.reload_parents(s3_object.key for s3_object in s3_objects)
+
+    def action_show_versions(self) -> None:
+        """Show the versions of the selected S3 object or of all objects below the selected prefix."""
+        s3_object = self.s3_tree.cursor_node.data
+
+        def reload_s3_tree(_) -> None:
+            self.s3_tree.reload_selected_prefix()
 
         self.push_screen(
-            ConfirmationScreen(
-                prompt=f"Do you want to delete the object {bucket}/{key_or_prefix}?",
-            ),
-            check_delete
+            VersionsScreen(bucket=self.bucket_name, key_or_prefix=s3_object.key, is_prefix=s3_object.is_dir),
+            reload_s3_tree
         )
 
-    async def do_s3_delete(self, bucket: str, key_or_prefix: str) -> None:
-        """Delete the given S3 object or prefix."""
+    def action_show_details(self) -> None:
+        """Show the details, metadata and ACL of the selected S3 object."""
+        s3_object = self.s3_tree.cursor_node.data
+        if s3_object.is_dir:
+            self.notify("Details can only be shown for objects, not for prefixes", title="Error", severity="error")
+            return
+
+        self.push_screen(ObjectDetailsScreen(bucket=self.bucket_name, s3_object=s3_object))
+
+    def action_edit_objects(self) -> None:
+        """Change the storage class, ACL, content type or metadata of the selected or marked objects and prefixes."""
+        bucket = self.bucket_name
+        s3_objects = self.selected_s3_objects
+
+        if len(s3_objects) == 1:
+            target = f"{bucket}/{s3_objects[0].key}"
+        else:
+            target = f"{len(s3_objects)} marked objects in {bucket}"
+
+        def check_changes(changes: ObjectChanges) -> None:
+            if not changes:
+                return
+
+            def check_update(do_update: bool) -> None:
+                if not do_update:
+                    return
+
+                self.s3_tree.clear_marks()
+                self.run_worker(self.do_update_objects(bucket, s3_objects, changes))
+
+            prompt = f"Do you want to update {target}?"
+            if changes.requires_copy:
+                prompt += " Objects are copied onto themselves, which creates a new version in versioned buckets."
+                if not changes.acl:
+                    prompt += " Their existing ACLs are re-applied after the copy."
+            self.push_screen(ConfirmationScreen(prompt=prompt), check_update)
+
+        self.push_screen(EditObjectsScreen(prompt=f"Edit {target}"), check_changes)
+
+    async def do_update_objects(self, bucket: str, s3_objects: typing.List[S3Object], changes: ObjectChanges) -> None:
+        """Apply the changes to the given objects and all objects below the given prefixes concurrently."""
         if self.dry_run:
-            self.notify(f'Would delete {bucket}/{key_or_prefix}', title='Dry Run')
+            keys = ", ".join(f'{bucket}/{s3_object.key}' for s3_object in s3_objects)
+            self.notify(f'Would update {keys} with {changes}', title='Dry Run')
             return
 
+        progress = ProgressScreen(prompt=f"Updating objects in {bucket}...")
+        await self.push_screen(progress)
         try:
-            self.s3_resource.Bucket(bucket).objects.filter(Prefix=key_or_prefix).delete()
+            failures = await self.backend.update_objects(bucket, s3_objects, changes, progress.update_progress)
         except botocore.exceptions.ClientError as e:
             self.notify(
-                f'Failed to delete S3 object(s) "{bucket}/{key_or_prefix}": {e.response["Error"]["Message"]}',
+                f'Failed to list objects to update in {bucket}: {e.response["Error"]["Message"]}',
                 title='Error',
                 severity='error'
             )
-        else:
+            return
+        finally:
+            # the progress screen may already have been hidden by the user
+            if self.screen is progress:
+                progress.dismiss()
+            self.details_cache.clear()
+
+        for (key,), e in failures:
+            self.notify(
+                f'Failed to update object {bucket}/{key}: {error_message(e)}',
+                title='Error',
+                severity='error'
+            )
+        if not progress.total:
+            self.notify(f'Nothing to update, the selection contains no objects in {bucket}', severity='warning')
+        elif progress.total > len(failures):
             self.notify(
-                f'Successfully deleted S3 object(s) "{bucket}/{key_or_prefix}"',
+                f'Successfully updated {progress.total - len(failures)} object(s) in {bucket}',
                 title='Success',
             )
-            self.query_one('#right S3Tree', S3Tree).reload_selected_prefix()
+        self.s3_tree.reload_selected_prefix()
 
     def action_select_bucket(self) -> None:
         """Show the bucket select screen and change the bucket if a bucket is selected"""
@@ -276,6 +461,9 @@ class BucketManApp(textual.app.App):
             select_bucket
         )
 
+    async def on_unmount(self) -> None:
+        await self.backend.close()
+
     def on_mount(self) -> None:
         if self.dry_run:
             self.notify(
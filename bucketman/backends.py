@@ -0,0 +1,378 @@
+"""Backends that run S3 calls for listing, transferring and deleting objects.
+
+All backend methods are coroutines that are awaited on Textual's event loop. The threaded backend runs the
+blocking boto3 calls in a thread pool, the async backend sends requests using aiobotocore and only uses threads
+for local file I/O.
+"""
+from __future__ import annotations
+import abc
+import asyncio
+import contextlib
+import functools
+import math
+import os
+import typing
+
+import botocore.exceptions
+
+from bucketman.batch import (
+    ERRORS,
+    TRANSFER_CONFIG,
+    ObjectChanges,
+    build_copy_args,
+    build_restore_acl_args,
+    delete_keys,
+    error_message,
+    iter_download_targets,
+    is_acl_not_supported,
+    iter_keys,
+    local_target_path,
+    parent_prefix,
+    run_concurrently,
+    update_object,
+)
+from bucketman.constants import (
+    MAX_ASYNC_REQUESTS,
+    MAX_CONCURRENT_TRANSFERS,
+    MULTIPART_CHUNKSIZE,
+    MULTIPART_CONCURRENCY,
+    S3_DELETE_BATCH_SIZE,
+)
+
+if typing.TYPE_CHECKING:
+    from bucketman.widgets.s3tree import S3Object
+
+Targets = typing.List[typing.Tuple[str, str]]
+Failures = typing.List[typing.Tuple[tuple, Exception]]
+ProgressCallback = typing.Callable[[int, int], None]
+
+
+def _read_chunk(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+class S3Backend(abc.ABC):
+    """Interface of the S3 operations used by the S3 tree and the transfer and delete actions."""
+
+    @abc.abstractmethod
+    async def list_prefix(self, bucket: str, prefix: str) -> typing.Tuple[typing.List[str], typing.List[dict]]:
+        """Return the common prefixes and the objects directly below the given prefix."""
+
+    @abc.abstractmethod
+    async def list_download_targets(self, bucket: str, s3_objects: typing.List[S3Object], path: str) -> Targets:
+        """Return (key, local path) pairs for downloading the given objects and prefixes to the given folder."""
+
+    @abc.abstractmethod
+    async def download_files(self, bucket: str, targets: Targets) -> Failures:
+        """Download the given (key, local path) pairs concurrently and return the failed ones."""
+
+    @abc.abstractmethod
+    async def upload_files(self, bucket: str, targets: Targets) -> Failures:
+        """Upload the given (local path, key) pairs concurrently and return the failed ones."""
+
+    @abc.abstractmethod
+    async def delete(self, bucket: str, s3_objects: typing.List[S3Object]) -> typing.Tuple[int, typing.List[dict]]:
+        """Delete the given objects and prefixes. Return the number of deleted objects and the errors reported by S3."""
+
+    @abc.abstractmethod
+    async def head_object(self, bucket: str, key: str) -> dict:
+        """Return the HEAD response of the given object, which includes its metadata."""
+
+    @abc.abstractmethod
+    async def get_object_acl(self, bucket: str, key: str) -> dict:
+        """Return the owner and grants of the given object."""
+
+    @abc.abstractmethod
+    async def update_objects(self, bucket: str, s3_objects: typing.List[S3Object], changes: ObjectChanges, on_progress: ProgressCallback = None) -> Failures:
+        """Apply the changes to the given objects and all objects below the given prefixes concurrently.
+
+        on_progress is called with the number of finished and total objects, possibly from another thread.
+        Return the failed (key,) items.
+        """
+
+    async def close(self) -> None:
+        pass
+
+    async def _run(self, func: typing.Callable, *args, **kwargs):
+        """Run the given blocking function in a thread of the event loop's default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class ThreadedBackend(S3Backend):
+    """Backend that runs blocking boto3 calls in threads, one thread per in-flight request."""
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def _list_prefix(self, bucket: str, prefix: str):
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        result = paginator.paginate(Bucket=bucket, Delimiter="/", Prefix=prefix)
+
+        prefixes = [common_prefix["Prefix"] for common_prefix in result.search("CommonPrefixes") if common_prefix]
+        objects = [obj for obj in result.search("Contents") if obj]
+        return prefixes, objects
+
+    async def list_prefix(self, bucket, prefix):
+        return await self._run(self._list_prefix, bucket, prefix)
+
+    async def list_download_targets(self, bucket, s3_objects, path):
+        return await self._run(lambda: list(iter_download_targets(self.s3_client, bucket, s3_objects, path)))
+
+    def _download_file(self, bucket: str, key: str, target_path: str) -> None:
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        self.s3_client.download_file(bucket, key, target_path, Config=TRANSFER_CONFIG)
+
+    async def download_files(self, bucket, targets):
+        return await self._run(run_concurrently, functools.partial(self._download_file, bucket), targets)
+
+    def _upload_file(self, bucket: str, path: str, target_path: str) -> None:
+        self.s3_client.upload_file(path, bucket, target_path, Config=TRANSFER_CONFIG)
+
+    async def upload_files(self, bucket, targets):
+        return await self._run(run_concurrently, functools.partial(self._upload_file, bucket), targets)
+
+    async def delete(self, bucket, s3_objects):
+        return await self._run(
+            lambda: delete_keys(self.s3_client, bucket, iter_keys(self.s3_client, bucket, s3_objects))
+        )
+
+    async def head_object(self, bucket, key):
+        return await self._run(self.s3_client.head_object, Bucket=bucket, Key=key)
+
+    async def get_object_acl(self, bucket, key):
+        return await self._run(self.s3_client.get_object_acl, Bucket=bucket, Key=key)
+
+    async def update_objects(self, bucket, s3_objects, changes, on_progress=None):
+        keys = await self._run(lambda: [(key,) for key in iter_keys(self.s3_client, bucket, s3_objects)])
+        return await self._run(
+            run_concurrently,
+            functools.partial(update_object, self.s3_client, bucket, changes),
+            keys,
+            on_progress=on_progress,
+        )
+
+
+class AsyncBackend(S3Backend):
+    """Backend that uses aiobotocore to run requests on the asyncio event loop.
+
+    Requests are limited to MAX_ASYNC_REQUESTS in flight, which scales to thousands of small objects
+    without requiring a thread per request. Requires the optional aiobotocore dependency.
+    """
+
+    def __init__(self, access_key_id: str = None, secret_access_key: str = None, endpoint_url: str = None):
+        import aiobotocore.config
+        import aiobotocore.session
+
+        self._session = aiobotocore.session.get_session()
+        self._client_kwargs = dict(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            endpoint_url=endpoint_url,
+            # aiohttp only opens 10 connections by default, which would cap the number of requests in flight
+            config=aiobotocore.config.AioConfig(max_pool_connections=MAX_ASYNC_REQUESTS),
+        )
+        self._client = None
+        self._exit_stack = contextlib.AsyncExitStack()
+        # created lazily as they have to be bound to the running event loop
+        self._client_lock = None
+        self._semaphore = None
+        self._part_semaphore = None
+
+    async def client(self):
+        """Return the aiobotocore S3 client, creating it on first use."""
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(MAX_ASYNC_REQUESTS)
+            # bounds the number of chunks held in memory by all transfers, like the threaded backend's TransferConfig
+            self._part_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSFERS * MULTIPART_CONCURRENCY)
+
+        async with self._client_lock:
+            if self._client is None:
+                self._client = await self._exit_stack.enter_async_context(
+                    self._session.create_client("s3", **self._client_kwargs)
+                )
+        return self._client
+
+    async def _gather(self, func: typing.Callable, items: typing.List[tuple], on_progress: ProgressCallback = None) -> Failures:
+        """Await func for each item with at most MAX_ASYNC_REQUESTS running at once and return the failed items."""
+        await self.client()
+        done = 0
+
+        async def run(item):
+            nonlocal done
+            async with self._semaphore:
+                try:
+                    await func(*item)
+                except ERRORS as e:
+                    return item, e
+                finally:
+                    done += 1
+                    if on_progress:
+                        on_progress(done, len(items))
+
+        results = await asyncio.gather(*(run(item) for item in items))
+        return [result for result in results if result is not None]
+
+    async def list_prefix(self, bucket, prefix):
+        client = await self.client()
+        prefixes, objects = [], []
+        async for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Delimiter="/", Prefix=prefix):
+            prefixes += [common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", [])]
+            objects += page.get("Contents", [])
+        return prefixes, objects
+
+    async def _iter_keys(self, bucket: str, s3_objects: typing.List[S3Object]) -> typing.AsyncIterator[str]:
+        """Yield each key of the given objects and of all objects below the given prefixes once."""
+        client = await self.client()
+        seen = set()
+        for s3_object in s3_objects:
+            if not s3_object.is_dir:
+                if s3_object.key not in seen:
+                    seen.add(s3_object.key)
+                    yield s3_object.key
+                continue
+
+            async for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=s3_object.key):
+                for obj in page.get("Contents", []):
+                    if obj["Key"] not in seen:
+                        seen.add(obj["Key"])
+                        yield obj["Key"]
+
+    async def list_download_targets(self, bucket, s3_objects, path):
+        targets, seen = [], set()
+        for s3_object in s3_objects:
+            base = parent_prefix(s3_object.key)
+            async for key in self._iter_keys(bucket, [s3_object]):
+                target_path = local_target_path(path, base, key)
+                if target_path and key not in seen:
+                    seen.add(key)
+                    targets.append((key, target_path))
+        return targets
+
+    async def _download_file(self, bucket: str, key: str, target_path: str) -> None:
+        client = await self.client()
+        await self._run(os.makedirs, os.path.dirname(target_path), exist_ok=True)
+        response = await client.get_object(Bucket=bucket, Key=key)
+        body = response["Body"]
+        async with body:
+            f = await self._run(open, target_path, "wb")
+            try:
+                while True:
+                    async with self._part_semaphore:
+                        chunk = await body.read(MULTIPART_CHUNKSIZE)
+                        if not chunk:
+                            break
+                        await self._run(f.write, chunk)
+            finally:
+                await self._run(f.close)
+
+    async def download_files(self, bucket, targets):
+        return await self._gather(functools.partial(self._download_file, bucket), targets)
+
+    async def _upload_file(self, bucket: str, path: str, target_path: str) -> None:
+        client = await self.client()
+        size = await self._run(os.path.getsize, path)
+        if size <= MULTIPART_CHUNKSIZE:
+            async with self._part_semaphore:
+                body = await self._run(_read_chunk, path, 0, size)
+                await client.put_object(Bucket=bucket, Key=target_path, Body=body)
+            return
+
+        # S3 allows at most 10000 parts per upload, use bigger parts for very large files
+        chunksize = max(MULTIPART_CHUNKSIZE, math.ceil(size / 10000))
+        file_semaphore = asyncio.Semaphore(MULTIPART_CONCURRENCY)
+        upload_id = (await client.create_multipart_upload(Bucket=bucket, Key=target_path))["UploadId"]
+
+        async def upload_part(part_number: int, offset: int) -> dict:
+            # parts are read right before they're sent, so only the parts in flight are held in memory
+            async with file_semaphore, self._part_semaphore:
+                chunk = await self._run(_read_chunk, path, offset, chunksize)
+                response = await client.upload_part(
+                    Bucket=bucket, Key=target_path, UploadId=upload_id, PartNumber=part_number, Body=chunk
+                )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        tasks = [
+            asyncio.ensure_future(upload_part(part_number, offset))
+            for part_number, offset in enumerate(range(0, size, chunksize), start=1)
+        ]
+        try:
+            parts = await asyncio.gather(*tasks)
+            await client.complete_multipart_upload(
+                Bucket=bucket, Key=target_path, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            # stop the remaining parts before aborting, otherwise they would keep uploading into the aborted upload
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await client.abort_multipart_upload(Bucket=bucket, Key=target_path, UploadId=upload_id)
+            raise
+
+    async def upload_files(self, bucket, targets):
+        return await self._gather(functools.partial(self._upload_file, bucket), targets)
+
+    async def delete(self, bucket, s3_objects):
+        client = await self.client()
+        deleted, errors, batch, requests = 0, [], [], []
+
+        async def delete_batch(objects: typing.List[dict]) -> None:
+            nonlocal deleted
+            try:
+                async with self._semaphore:
+                    response = await client.delete_objects(Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+            except ERRORS as e:
+                # none of the batch's objects have been deleted, report them like the errors returned by S3
+                errors.extend({"Key": obj["Key"], "Message": error_message(e)} for obj in objects)
+                return
+            batch_errors = response.get("Errors", [])
+            deleted += len(objects) - len(batch_errors)
+            errors.extend(batch_errors)
+
+        try:
+            async for key in self._iter_keys(bucket, s3_objects):
+                batch.append({"Key": key})
+                if len(batch) == S3_DELETE_BATCH_SIZE:
+                    requests.append(asyncio.ensure_future(delete_batch(batch)))
+                    batch = []
+            if batch:
+                requests.append(asyncio.ensure_future(delete_batch(batch)))
+        finally:
+            # wait for the batches already sent even if listing the remaining keys fails
+            await asyncio.gather(*requests)
+        return deleted, errors
+
+    async def head_object(self, bucket, key):
+        client = await self.client()
+        return await client.head_object(Bucket=bucket, Key=key)
+
+    async def get_object_acl(self, bucket, key):
+        client = await self.client()
+        return await client.get_object_acl(Bucket=bucket, Key=key)
+
+    async def _update_object(self, bucket: str, changes: ObjectChanges, key: str) -> None:
+        client = await self.client()
+        if not changes.requires_copy:
+            await client.put_object_acl(Bucket=bucket, Key=key, ACL=changes.acl)
+            return
+
+        head = await client.head_object(Bucket=bucket, Key=key)
+        acl = None if changes.acl else await client.get_object_acl(Bucket=bucket, Key=key)
+        response = await client.copy_object(**build_copy_args(bucket, key, head, changes))
+        if acl:
+            try:
+                await client.put_object_acl(**build_restore_acl_args(bucket, key, acl, response))
+            except botocore.exceptions.ClientError as e:
+                if not is_acl_not_supported(e):
+                    raise
+
+    async def update_objects(self, bucket, s3_objects, changes, on_progress=None):
+        keys = [(key,) async for key in self._iter_keys(bucket, s3_objects)]
+        return await self._gather(functools.partial(self._update_object, bucket, changes), keys, on_progress)
+
+    async def close(self):
+        await self._exit_stack.aclose()
+        self._client = None
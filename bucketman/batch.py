@@ -0,0 +1,281 @@
+"""Helpers for running actions on multiple S3 objects or local paths at once."""
+from __future__ import annotations
+import concurrent.futures
+import dataclasses
+import os
+import typing
+
+import boto3.exceptions
+import boto3.s3.transfer
+import botocore.exceptions
+
+from bucketman.constants import (
+    MAX_CONCURRENT_TRANSFERS,
+    MAX_COPY_SIZE,
+    MULTIPART_CHUNKSIZE,
+    MULTIPART_CONCURRENCY,
+    S3_DELETE_BATCH_SIZE,
+)
+
+if typing.TYPE_CHECKING:
+    from bucketman.widgets.s3tree import S3Object
+
+# boto3 already transfers files above the chunk size in parts, but runs up to 10 parts per file in parallel.
+# Limiting that to MULTIPART_CONCURRENCY keeps the number of parts held in memory by a batch of
+# MAX_CONCURRENT_TRANSFERS files at MAX_CONCURRENT_TRANSFERS * MULTIPART_CONCURRENCY.
+TRANSFER_CONFIG = boto3.s3.transfer.TransferConfig(
+    multipart_threshold=MULTIPART_CHUNKSIZE,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    max_concurrency=MULTIPART_CONCURRENCY,
+)
+
+ERRORS = (
+    botocore.exceptions.BotoCoreError,
+    botocore.exceptions.ClientError,
+    boto3.exceptions.Boto3Error,
+    OSError,
+    ValueError,
+)
+
+
+def error_message(error: Exception) -> str:
+    """Return a human readable message for the given error."""
+    if isinstance(error, botocore.exceptions.ClientError):
+        return error.response["Error"]["Message"]
+    if isinstance(error, OSError) and error.strerror:
+        return error.strerror
+    return str(error)
+
+
+def parent_prefix(key: str) -> str:
+    """Return the prefix containing the given key or prefix, e.g. "a/b/" for "a/b/c" and "a/b/c/"."""
+    parent, sep, _ = key.rstrip("/").rpartition("/")
+    return parent + sep
+
+
+def iter_keys(s3_client, bucket: str, s3_objects: typing.Iterable[S3Object]) -> typing.Iterator[str]:
+    """Yield the keys of the given objects. Prefixes are expanded to the keys of all objects below them.
+
+    Each key is only yielded once, even if both a prefix and an object below it are given.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    seen = set()
+    for s3_object in s3_objects:
+        if not s3_object.is_dir:
+            keys = [s3_object.key]
+        else:
+            keys = (obj["Key"] for obj in paginator.paginate(Bucket=bucket, Prefix=s3_object.key).search("Contents") if obj)
+
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                yield key
+
+
+def local_target_path(path: str, base: str, key: str) -> typing.Optional[str]:
+    """Return the local path to download the given key to, keeping its structure relative to base.
+
+    Empty, "." and ".." segments of the key are dropped. Return None if the key doesn't map to a file
+    or the resulting path would end up outside of the given folder, e.g. because of a symlink.
+    """
+    if key.endswith("/"):
+        return None
+
+    segments = [segment for segment in key[len(base):].split("/") if segment not in ("", ".", "..")]
+    if not segments:
+        return None
+
+    root = os.path.realpath(path)
+    target_path = os.path.realpath(os.path.join(root, *segments))
+    if os.path.commonpath([root, target_path]) != root or target_path == root:
+        return None
+    return target_path
+
+
+def iter_download_targets(s3_client, bucket: str, s3_objects: typing.Iterable[S3Object], path: str) -> typing.Iterator[typing.Tuple[str, str]]:
+    """Yield (key, local path) pairs for downloading the given objects into the given local folder.
+
+    Objects below a selected prefix keep their structure relative to the prefix's parent.
+    Keys that would be written outside of the folder are skipped, keys that were already yielded as well.
+    """
+    seen = set()
+    for s3_object in s3_objects:
+        base = parent_prefix(s3_object.key)
+        for key in iter_keys(s3_client, bucket, [s3_object]):
+            target_path = local_target_path(path, base, key)
+            if target_path and key not in seen:
+                seen.add(key)
+                yield key, target_path
+
+
+def drop_nested_paths(paths: typing.Iterable[str]) -> typing.List[str]:
+    """Return the given local paths without duplicates and without the ones below another given path."""
+    paths = list(dict.fromkeys(os.path.abspath(path) for path in paths))
+    return [
+        path for path in paths
+        if not any(other != path and os.path.commonpath([other, path]) == other for other in paths)
+    ]
+
+
+def iter_upload_targets(paths: typing.Iterable[str], prefix: str) -> typing.Iterator[typing.Tuple[str, str]]:
+    """Yield (local path, key) pairs for uploading the given local files/folders to the given prefix."""
+    for path in paths:
+        target_path = os.path.join(prefix, os.path.basename(os.path.normpath(path)))
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for file in files:
+                    yield os.path.join(root, file), os.path.normpath(
+                        os.path.join(target_path, os.path.relpath(root, path), file)
+                    )
+        else:
+            yield path, target_path
+
+
+def run_concurrently(func: typing.Callable, items: typing.Iterable[tuple], max_workers: int = MAX_CONCURRENT_TRANSFERS, on_progress: typing.Callable[[int, int], None] = None) -> typing.List[typing.Tuple[tuple, Exception]]:
+    """Call func with each item's arguments using a pool of threads.
+
+    on_progress is called with the number of finished and total calls whenever a call finishes.
+    Return a list of (item, error) tuples for all calls that failed.
+    """
+    failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(func, *item): item for item in items}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            try:
+                future.result()
+            except ERRORS as e:
+                failures.append((futures[future], e))
+            if on_progress:
+                on_progress(done, len(futures))
+    return failures
+
+
+def delete_objects(s3_client, bucket: str, objects: typing.Iterable[dict]) -> typing.Tuple[int, typing.List[dict]]:
+    """Delete the given objects ({"Key": ..., "VersionId": ...}) using as few DeleteObjects requests as possible.
+
+    Return the number of deleted objects and the errors reported by S3.
+    """
+    deleted, errors, batch = 0, [], []
+
+    def flush():
+        nonlocal deleted
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": batch, "Quiet": True},
+        )
+        batch_errors = response.get("Errors", [])
+        deleted += len(batch) - len(batch_errors)
+        errors.extend(batch_errors)
+        batch.clear()
+
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == S3_DELETE_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    return deleted, errors
+
+
+def delete_keys(s3_client, bucket: str, keys: typing.Iterable[str]) -> typing.Tuple[int, typing.List[dict]]:
+    """Delete the current version of the given keys in batches."""
+    return delete_objects(s3_client, bucket, ({"Key": key} for key in keys))
+
+
+def delete_versions(s3_client, bucket: str, versions: typing.Iterable[typing.Tuple[str, str]]) -> typing.Tuple[int, typing.List[dict]]:
+    """Permanently delete the given (key, version ID) pairs in batches."""
+    return delete_objects(
+        s3_client, bucket, ({"Key": key, "VersionId": version_id} for key, version_id in versions)
+    )
+
+
+@dataclasses.dataclass
+class ObjectChanges:
+    """Changes to apply to S3 objects in place. Fields that are None are left unchanged."""
+    storage_class: str = None
+    acl: str = None
+    content_type: str = None
+    metadata: dict = dataclasses.field(default_factory=dict)
+
+    @property
+    def requires_copy(self) -> bool:
+        """Whether the changes require copying the object onto itself. ACLs can be changed without a copy."""
+        return bool(self.storage_class or self.content_type or self.metadata)
+
+
+# headers that are dropped by a copy with MetadataDirective=REPLACE unless they're passed again
+PRESERVED_HEADERS = (
+    "CacheControl",
+    "ContentDisposition",
+    "ContentEncoding",
+    "ContentLanguage",
+    "ContentType",
+    "Expires",
+    "WebsiteRedirectLocation",
+)
+
+
+def build_copy_args(bucket: str, key: str, head: dict, changes: ObjectChanges) -> dict:
+    """Return the copy_object arguments to apply the changes to the object described by the HEAD response."""
+    if head.get("ContentLength", 0) > MAX_COPY_SIZE:
+        raise ValueError(f"{key} is larger than 5 GiB and can't be copied in place")
+
+    args = {header: head[header] for header in PRESERVED_HEADERS if header in head}
+    args.update(
+        Bucket=bucket,
+        Key=key,
+        CopySource={"Bucket": bucket, "Key": key},
+        MetadataDirective="REPLACE",
+        Metadata={**head.get("Metadata", {}), **changes.metadata},
+        # HEAD doesn't return the storage class of STANDARD objects, but a copy would reset any other class
+        StorageClass=changes.storage_class or head.get("StorageClass", "STANDARD"),
+    )
+    if changes.content_type:
+        args["ContentType"] = changes.content_type
+    if changes.acl:
+        args["ACL"] = changes.acl
+    if head.get("ServerSideEncryption") in ("aws:kms", "aws:kms:dsse"):
+        args.update(ServerSideEncryption=head["ServerSideEncryption"], SSEKMSKeyId=head["SSEKMSKeyId"])
+        if head.get("BucketKeyEnabled"):
+            args["BucketKeyEnabled"] = True
+    return args
+
+
+def build_restore_acl_args(bucket: str, key: str, acl: dict, copy_response: dict) -> dict:
+    """Return the put_object_acl arguments to re-apply the grants of get_object_acl to the copied object.
+
+    A copy without ACL resets the object's grants to private, so they have to be set again afterwards.
+    """
+    args = dict(Bucket=bucket, Key=key, AccessControlPolicy={"Grants": acl["Grants"], "Owner": acl["Owner"]})
+    if copy_response.get("VersionId"):
+        args["VersionId"] = copy_response["VersionId"]
+    return args
+
+
+def is_acl_not_supported(error: Exception) -> bool:
+    """Whether the error was raised because ACLs are disabled for the bucket, so there's no ACL to preserve."""
+    return (
+        isinstance(error, botocore.exceptions.ClientError)
+        and error.response["Error"]["Code"] == "AccessControlListNotSupported"
+    )
+
+
+def update_object(s3_client, bucket: str, changes: ObjectChanges, key: str) -> None:
+    """Apply the changes to the given object, using an in-place copy if required.
+
+    Unless the changes set a new ACL, the object's existing ACL is re-applied after the copy.
+    """
+    if not changes.requires_copy:
+        s3_client.put_object_acl(Bucket=bucket, Key=key, ACL=changes.acl)
+        return
+
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    acl = None if changes.acl else s3_client.get_object_acl(Bucket=bucket, Key=key)
+    response = s3_client.copy_object(**build_copy_args(bucket, key, head, changes))
+    if acl:
+        try:
+            s3_client.put_object_acl(**build_restore_acl_args(bucket, key, acl, response))
+        except botocore.exceptions.ClientError as e:
+            if not is_acl_not_supported(e):
+                raise
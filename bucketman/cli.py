@@ -1,3 +1,4 @@
+import importlib.util
 import warnings
 import click
 
@@ -57,13 +58,25 @@ class RequiredIf(click.Option):
 )
 @click.option("--bucket", help="Set the S3 bucket to open.")
 @click.option("--dry-run", is_flag=True, help="Enable dry run mode, which disables all write operations and notifies you of what would happen.", default=False)
-def main(endpoint_url, access_key_id, secret_access_key, bucket, dry_run):
+@click.option(
+    "--backend",
+    type=click.Choice(["threaded", "async"]),
+    default="threaded",
+    help="Set the backend used for listing, transferring and deleting objects. The async backend requires aiobotocore.",
+)
+def main(endpoint_url, access_key_id, secret_access_key, bucket, dry_run, backend):
+    if backend == "async" and importlib.util.find_spec("aiobotocore") is None:
+        raise click.UsageError(
+            "The async backend requires aiobotocore, install it using `pip install bucketman[async]`"
+        )
+
     BucketManApp(
         bucket=bucket,
         endpoint_url=endpoint_url,
         access_key_id=access_key_id,
         secret_access_key=secret_access_key,
-        dry_run=dry_run
+        dry_run=dry_run,
+        backend=backend,
     ).run()
 
 if __name__ == "__main__":
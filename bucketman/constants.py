@@ -1 +1,40 @@
 AWS_HEX_COLOR_CODE = "#FF9900"
+MARKED_STYLE = f"bold {AWS_HEX_COLOR_CODE}"
+
+# number of files that are transferred in parallel by batch actions
+MAX_CONCURRENT_TRANSFERS = 10
+# size of the parts of multipart transfers and number of parts transferred in parallel per file
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+# maximum number of keys the DeleteObjects API accepts per request
+S3_DELETE_BATCH_SIZE = 1000
+# number of versions requested per ListObjectVersions call (maximum allowed by S3)
+VERSIONS_PAGE_SIZE = 1000
+# load the next page of versions when the cursor gets this close to the last loaded row
+VERSIONS_PRELOAD_ROWS = 50
+# maximum number of requests in flight when using the async backend
+MAX_ASYNC_REQUESTS = 64
+# number of objects whose HEAD and ACL responses are cached for the details screen
+DETAILS_CACHE_SIZE = 256
+# copy_object only supports objects up to 5 GiB
+MAX_COPY_SIZE = 5 * 1024 * 1024 * 1024
+
+STORAGE_CLASSES = [
+    "STANDARD",
+    "STANDARD_IA",
+    "ONEZONE_IA",
+    "INTELLIGENT_TIERING",
+    "GLACIER_IR",
+    "GLACIER",
+    "DEEP_ARCHIVE",
+    "REDUCED_REDUNDANCY",
+]
+CANNED_ACLS = [
+    "private",
+    "public-read",
+    "public-read-write",
+    "authenticated-read",
+    "aws-exec-read",
+    "bucket-owner-read",
+    "bucket-owner-full-control",
+]
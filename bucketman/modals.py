@@ -1,9 +1,30 @@
+from __future__ import annotations
+import dataclasses
+import datetime
+import typing
+
 import botocore.exceptions
 import textual.app
 from textual.app import ComposeResult
 import textual.containers
 import textual.screen
 import textual.widgets
+import textual.worker
+import rich.table
+import rich.text
+
+from bucketman.batch import ERRORS, ObjectChanges, delete_versions, error_message, run_concurrently
+from bucketman.constants import (
+    CANNED_ACLS,
+    MARKED_STYLE,
+    STORAGE_CLASSES,
+    VERSIONS_PAGE_SIZE,
+    VERSIONS_PRELOAD_ROWS,
+)
+from bucketman.utils import format_size, parse_metadata
+
+if typing.TYPE_CHECKING:
+    from bucketman.widgets.s3tree import S3Object
 
 class ConfirmationScreen(textual.screen.ModalScreen[bool]):
     """A screen that displays a prompt and two buttons, Yes and No, to confirm or cancel an action."""
@@ -42,6 +63,7 @@ class ConfirmationScreen(textual.screen.ModalScreen[bool]):
     BINDINGS = [
         textual.binding.Binding("left", "select_left", "Focus previous", show=False),
         textual.binding.Binding("right", "select_right", "Focus next", show=False),
+        textual.binding.Binding("escape", "cancel", "Cancel", show=False),
     ]
 
     def __init__(
@@ -70,6 +92,9 @@ class ConfirmationScreen(textual.screen.ModalScreen[bool]):
     def action_select_right(self) -> None:
         self.query_one("#yes").focus()
 
+    def action_cancel(self) -> None:
+        self.dismiss(False)
+
     def on_button_pressed(self, event: textual.widgets.Button.Pressed) -> None:
         if event.button.id == "yes":
             self.dismiss(True)
@@ -102,6 +127,10 @@ class BucketSelectScreen(textual.screen.ModalScreen[str]):
     }
     """
 
+    BINDINGS = [
+        textual.binding.Binding("escape,q", "app.quit", "Quit", show=False),
+    ]
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.__buckets = []
@@ -135,4 +164,687 @@ class BucketSelectScreen(textual.screen.ModalScreen[str]):
             textual.widgets.LoadingIndicator(),
             id="loading"
         )
-        yield textual.widgets.OptionList(id='buckets')
\ No newline at end of file
+        yield textual.widgets.OptionList(id='buckets')
+
+class PatternInputScreen(textual.screen.ModalScreen[str]):
+    """A screen that asks for a glob or regex pattern used to mark multiple objects."""
+
+    CSS = """
+    PatternInputScreen {
+        align: center middle;
+    }
+
+    #dialog {
+        padding: 0 1;
+        width: 60%;
+        height: auto;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #prompt {
+        width: 1fr;
+        text-align: center;
+    }
+    """
+
+    def compose(self) -> textual.app.ComposeResult:
+        yield textual.containers.Vertical(
+            textual.widgets.Label(
+                "Mark objects matching a glob pattern (e.g. *.log) or a regex enclosed in slashes (e.g. /^log-\\d+/). Press escape to cancel.",
+                id="prompt",
+            ),
+            textual.widgets.Input(placeholder="*.log", id="pattern"),
+            id="dialog",
+        )
+
+    BINDINGS = [
+        textual.binding.Binding("escape", "cancel", "Cancel", show=False),
+    ]
+
+    def on_mount(self) -> None:
+        self.query_one("#pattern").focus()
+
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+    def on_input_submitted(self, event: textual.widgets.Input.Submitted) -> None:
+        self.dismiss(event.value.strip())
+
+
+@dataclasses.dataclass
+class S3Version:
+    key: str
+    version_id: str
+    size: float
+    last_modified: datetime.datetime
+    is_latest: bool
+    is_delete_marker: bool = False
+
+    @classmethod
+    def from_response(cls, entry: dict, is_delete_marker: bool = False) -> S3Version:
+        """Create a version from an entry of the Versions or DeleteMarkers list of a ListObjectVersions response."""
+        return cls(
+            key=entry["Key"],
+            version_id=entry["VersionId"],
+            size=entry.get("Size", 0),
+            last_modified=entry.get("LastModified"),
+            is_latest=entry.get("IsLatest", False),
+            is_delete_marker=is_delete_marker,
+        )
+
+    @property
+    def row_key(self) -> str:
+        return f"{self.key}\0{self.version_id}"
+
+
+class VersionsScreen(textual.screen.ModalScreen[None]):
+    """A screen that lists the versions and delete markers of an S3 object or of all objects below a prefix.
+
+    Versions are loaded page by page while scrolling through the list.
+    """
+
+    CSS = """
+    VersionsScreen {
+        align: center middle;
+    }
+
+    #dialog {
+        width: 90%;
+        height: 80%;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #summary {
+        height: auto;
+        padding: 0 1;
+    }
+
+    #versions {
+        height: 1fr;
+    }
+    """
+
+    BINDINGS = [
+        textual.binding.Binding("escape,v", "close", "Close", show=True, key_display="ESC"),
+        textual.binding.Binding("m", "mark", "Mark", show=True),
+        textual.binding.Binding("a", "load_all", "Load All", show=True),
+        textual.binding.Binding("R", "restore", "Restore", show=True, key_display="Shift+r"),
+        textual.binding.Binding("D", "delete", "Delete", show=True, key_display="Shift+d"),
+        textual.binding.Binding("P", "purge", "Purge Noncurrent", show=True, key_display="Shift+p"),
+    ]
+
+    def __init__(self, *args, bucket: str, key_or_prefix: str, is_prefix: bool, **kwargs):
+        self.bucket = bucket
+        self.key_or_prefix = key_or_prefix
+        self.is_prefix = is_prefix
+        self._versions: typing.Dict[str, S3Version] = {}
+        self._marked: typing.Set[str] = set()
+        self._key_marker = None
+        self._version_id_marker = None
+        self._complete = False
+        self._loading = False
+        super().__init__(*args, **kwargs)
+
+    def compose(self) -> textual.app.ComposeResult:
+        yield textual.containers.Vertical(
+            textual.widgets.Static(id="summary"),
+            textual.widgets.DataTable(id="versions", cursor_type="row"),
+            textual.widgets.Footer(),
+            id="dialog",
+        )
+
+    def on_mount(self) -> None:
+        table = self.query_one("#versions", textual.widgets.DataTable)
+        table.add_column("", key="mark", width=1)
+        table.add_column("Key", key="key")
+        table.add_column("Version ID", key="version_id")
+        table.add_column("Last Modified", key="last_modified")
+        table.add_column("Size", key="size")
+        table.add_column("State", key="state")
+        table.focus()
+        self.reload()
+
+    @property
+    def table(self) -> textual.widgets.DataTable:
+        return self.query_one("#versions", textual.widgets.DataTable)
+
+    @property
+    def selected_versions(self) -> typing.List[S3Version]:
+        """Return the marked versions. If nothing is marked, return the version under the cursor."""
+        if self._marked:
+            return [version for row_key, version in self._versions.items() if row_key in self._marked]
+        if not self._versions:
+            return []
+        row_key, _ = self.table.coordinate_to_cell_key(self.table.cursor_coordinate)
+        return [self._versions[row_key.value]]
+
+    def reload(self) -> None:
+        """Clear the list and load the first page of versions, cancelling any page that is still loading."""
+        self._versions.clear()
+        self._marked.clear()
+        self._key_marker = None
+        self._version_id_marker = None
+        self._complete = False
+        self._loading = False
+        self.table.clear()
+        self.update_summary()
+        self.load_next_page()
+
+    def load_next_page(self, load_all: bool = False) -> None:
+        if self._loading or self._complete:
+            return
+
+        self._loading = True
+        self.run_worker(self.do_load_pages(load_all), thread=True, group="load_versions", exclusive=True)
+
+    async def do_load_pages(self, load_all: bool) -> None:
+        """Load the next page of versions, or all remaining pages if load_all is set.
+
+        The list is only updated from the main thread, and not at all once the worker has been cancelled by a reload.
+        """
+        worker = textual.worker.get_current_worker()
+        key_marker, version_id_marker, complete = self._key_marker, self._version_id_marker, self._complete
+        try:
+            while not complete:
+                versions, key_marker, version_id_marker, complete = self.fetch_page(key_marker, version_id_marker)
+                if not self.app.call_from_thread(self.add_page, worker, versions, key_marker, version_id_marker, complete):
+                    return
+                if not load_all:
+                    break
+        except botocore.exceptions.ClientError as e:
+            self.notify(
+                f'Failed to list versions of {self.bucket}/{self.key_or_prefix}: {e.response["Error"]["Message"]}',
+                title="Error",
+                severity="error"
+            )
+        finally:
+            self.app.call_from_thread(self.finish_loading, worker)
+
+    def fetch_page(self, key_marker: typing.Optional[str], version_id_marker: typing.Optional[str]):
+        """Request the page of ListObjectVersions following the given markers.
+
+        Return its versions and delete markers, the markers of the next page and whether this was the last page.
+        """
+        kwargs = dict(Bucket=self.bucket, Prefix=self.key_or_prefix, MaxKeys=VERSIONS_PAGE_SIZE)
+        if key_marker is not None:
+            kwargs.update(KeyMarker=key_marker, VersionIdMarker=version_id_marker)
+
+        response = self.app.s3_client.list_object_versions(**kwargs)
+
+        versions = [S3Version.from_response(entry) for entry in response.get("Versions", [])]
+        versions += [S3Version.from_response(entry, True) for entry in response.get("DeleteMarkers", [])]
+        if not self.is_prefix:
+            versions = [version for version in versions if version.key == self.key_or_prefix]
+        # S3 returns versions and delete markers in separate lists, merge them into a single history per key
+        versions.sort(key=lambda version: version.last_modified, reverse=True)
+        versions.sort(key=lambda version: version.key)
+        return (
+            versions,
+            response.get("NextKeyMarker"),
+            response.get("NextVersionIdMarker"),
+            not response.get("IsTruncated") or self.is_past_key(response),
+        )
+
+    def is_past_key(self, response: dict) -> bool:
+        """Whether the ListObjectVersions page shows that all versions of the single key have been listed.
+
+        Listing the versions of a key uses it as prefix, which also lists the keys below it, e.g. "logs/a" for "logs".
+        As the key sorts before all of them, its versions are complete once the listing reaches a different key.
+        """
+        if self.is_prefix:
+            return False
+
+        entries = response.get("Versions", []) + response.get("DeleteMarkers", [])
+        return (
+            any(entry["Key"] != self.key_or_prefix for entry in entries)
+            or response.get("NextKeyMarker", self.key_or_prefix) != self.key_or_prefix
+        )
+
+    def add_page(self, worker: textual.worker.Worker, versions: typing.List[S3Version], key_marker: str, version_id_marker: str, complete: bool) -> bool:
+        """Add a loaded page and remember the markers of the next one. Return False if the worker has been cancelled."""
+        if worker.is_cancelled:
+            return False
+
+        self._key_marker, self._version_id_marker, self._complete = key_marker, version_id_marker, complete
+        self.add_versions(versions)
+        return True
+
+    def finish_loading(self, worker: textual.worker.Worker) -> None:
+        if not worker.is_cancelled:
+            self._loading = False
+
+    def add_versions(self, versions: typing.List[S3Version]) -> None:
+        for version in versions:
+            if version.row_key in self._versions:
+                continue
+
+            self._versions[version.row_key] = version
+            if version.is_delete_marker:
+                state = "delete marker"
+            else:
+                state = "current" if version.is_latest else "noncurrent"
+            self.table.add_row(
+                "",
+                version.key,
+                version.version_id,
+                version.last_modified.strftime("%Y-%m-%d %H:%M:%S") if version.last_modified else "",
+                "" if version.is_delete_marker else format_size(version.size),
+                state,
+                key=version.row_key,
+            )
+        self.update_summary()
+
+    def update_summary(self) -> None:
+        noncurrent = [
+            version for version in self._versions.values()
+            if not version.is_latest and not version.is_delete_marker
+        ]
+        delete_markers = sum(1 for version in self._versions.values() if version.is_delete_marker)
+        noncurrent_bytes = format_size(sum(version.size for version in noncurrent))
+
+        summary = (
+            f"Versions of [b]{self.bucket}/{self.key_or_prefix}[/b]: "
+            f"{noncurrent_bytes} in {len(noncurrent)} noncurrent version(s), {delete_markers} delete marker(s)"
+        )
+        if not self._complete:
+            summary += f" in the first {len(self._versions)} loaded entries, press [b]a[/b] to load all"
+        self.query_one("#summary", textual.widgets.Static).update(summary)
+
+    def on_data_table_row_highlighted(self, event: textual.widgets.DataTable.RowHighlighted) -> None:
+        if event.cursor_row >= self.table.row_count - VERSIONS_PRELOAD_ROWS:
+            self.load_next_page()
+
+    def action_close(self) -> None:
+        self.dismiss()
+
+    def action_load_all(self) -> None:
+        self.load_next_page(load_all=True)
+
+    def action_mark(self) -> None:
+        """Toggle the mark of the version under the cursor and move the cursor to the next row."""
+        if not self._versions:
+            return
+
+        row_key, _ = self.table.coordinate_to_cell_key(self.table.cursor_coordinate)
+        if row_key.value in self._marked:
+            self._marked.remove(row_key.value)
+            self.table.update_cell(row_key, "mark", "")
+        else:
+            self._marked.add(row_key.value)
+            self.table.update_cell(row_key, "mark", rich.text.Text("●", style=MARKED_STYLE))
+        self.table.action_cursor_down()
+
+    def action_restore(self) -> None:
+        """Restore the selected versions by copying them over the current version after confirmation."""
+        versions = []
+        for version in self.selected_versions:
+            # restoring multiple versions of the same key would overwrite each other, only keep the most recent one
+            if version.is_delete_marker or version.is_latest or version.key in {v.key for v in versions}:
+                continue
+            versions.append(version)
+
+        if not versions:
+            self.notify("Only noncurrent versions can be restored", title="Error", severity="error")
+            return
+
+        def check_restore(do_restore: bool) -> None:
+            if do_restore:
+                self.run_worker(self.do_restore(versions), thread=True)
+
+        self.app.push_screen(
+            ConfirmationScreen(
+                prompt=f"Do you want to restore {len(versions)} version(s) in {self.bucket}?",
+            ),
+            check_restore
+        )
+
+    async def do_restore(self, versions: typing.List[S3Version]) -> None:
+        if self.app.dry_run:
+            self.notify(f"Would restore {len(versions)} version(s) in {self.bucket}", title="Dry Run")
+            return
+
+        def restore(key: str, version_id: str) -> None:
+            self.app.s3_client.copy(
+                {"Bucket": self.bucket, "Key": key, "VersionId": version_id}, self.bucket, key
+            )
+
+        failures = run_concurrently(restore, [(version.key, version.version_id) for version in versions])
+        for (key, version_id), e in failures:
+            self.notify(
+                f"Failed to restore version {version_id} of {self.bucket}/{key}: {error_message(e)}",
+                title="Error",
+                severity="error"
+            )
+        if len(versions) > len(failures):
+            self.notify(f"Successfully restored {len(versions) - len(failures)} version(s)", title="Success")
+        self.app.call_from_thread(self.reload)
+
+    def action_delete(self) -> None:
+        """Permanently delete the selected versions and delete markers after confirmation."""
+        versions = self.selected_versions
+        if not versions:
+            return
+
+        def check_delete(do_delete: bool) -> None:
+            if do_delete:
+                self.run_worker(
+                    self.do_delete_versions([(version.key, version.version_id) for version in versions]),
+                    thread=True
+                )
+
+        self.app.push_screen(
+            ConfirmationScreen(
+                prompt=f"Do you want to permanently delete {len(versions)} version(s) in {self.bucket}? This can't be undone.",
+            ),
+            check_delete
+        )
+
+    def action_purge(self) -> None:
+        """Permanently delete all noncurrent versions and delete markers, including the ones not loaded yet, after confirmation."""
+        def check_purge(do_purge: bool) -> None:
+            if do_purge:
+                self.run_worker(self.do_delete_versions(self.iter_noncurrent_versions()), thread=True)
+
+        self.app.push_screen(
+            ConfirmationScreen(
+                prompt=f"Do you want to permanently delete all noncurrent versions and delete markers of {self.bucket}/{self.key_or_prefix}? This can't be undone.",
+            ),
+            check_purge
+        )
+
+    def iter_noncurrent_versions(self):
+        """Yield (key, version ID) pairs of all noncurrent versions and delete markers below the key or prefix."""
+        paginator = self.app.s3_client.get_paginator("list_object_versions")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.key_or_prefix):
+            for entry in page.get("Versions", []):
+                if not entry["IsLatest"] and (self.is_prefix or entry["Key"] == self.key_or_prefix):
+                    yield entry["Key"], entry["VersionId"]
+            for entry in page.get("DeleteMarkers", []):
+                if self.is_prefix or entry["Key"] == self.key_or_prefix:
+                    yield entry["Key"], entry["VersionId"]
+            if self.is_past_key(page):
+                return
+
+    async def do_delete_versions(self, versions) -> None:
+        try:
+            if self.app.dry_run:
+                self.notify(f"Would permanently delete {len(list(versions))} version(s) in {self.bucket}", title="Dry Run")
+                return
+
+            deleted, errors = delete_versions(self.app.s3_client, self.bucket, versions)
+        except botocore.exceptions.ClientError as e:
+            self.notify(
+                f'Failed to delete versions in {self.bucket}: {e.response["Error"]["Message"]}',
+                title="Error",
+                severity="error"
+            )
+            return
+
+        for error in errors:
+            self.notify(
+                f'Failed to delete version {error.get("VersionId")} of {self.bucket}/{error["Key"]}: {error["Message"]}',
+                title="Error",
+                severity="error"
+            )
+        if deleted:
+            self.notify(f"Successfully deleted {deleted} version(s) in {self.bucket}", title="Success")
+        self.app.call_from_thread(self.reload)
+
+
+class ObjectDetailsScreen(textual.screen.ModalScreen[None]):
+    """A screen that shows the listing fields, metadata and ACL of an S3 object.
+
+    The HEAD and ACL responses are fetched when the screen is opened and cached by the app.
+    """
+
+    CSS = """
+    ObjectDetailsScreen {
+        align: center middle;
+    }
+
+    #dialog {
+        width: 80%;
+        height: auto;
+        max-height: 80%;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #details {
+        height: auto;
+        padding: 0 1;
+    }
+    """
+
+    BINDINGS = [
+        textual.binding.Binding("escape,i", "close", "Close", show=True, key_display="ESC"),
+    ]
+
+    def __init__(self, *args, bucket: str, s3_object: S3Object, **kwargs):
+        self.bucket = bucket
+        self.s3_object = s3_object
+        super().__init__(*args, **kwargs)
+
+    def compose(self) -> textual.app.ComposeResult:
+        yield textual.containers.VerticalScroll(
+            textual.widgets.Static(id="details"),
+            textual.widgets.Footer(),
+            id="dialog",
+        )
+
+    def on_mount(self) -> None:
+        self.show_details(None, None)
+        self.run_worker(self.load_details())
+
+    async def load_details(self) -> None:
+        """Show the cached details of the object or fetch them if the object changed since they were cached."""
+        cache = self.app.details_cache
+        cache_key = (self.bucket, self.s3_object.key)
+        if cache_key in cache and cache[cache_key][0] == self.s3_object.etag:
+            _, head, acl = cache[cache_key]
+            self.show_details(head, acl)
+            return
+
+        try:
+            head = await self.app.backend.head_object(self.bucket, self.s3_object.key)
+        except ERRORS as e:
+            # errors aren't cached, so the details are requested again when the screen is reopened
+            self.show_details(f"Failed to load metadata and ACL: {error_message(e)}", None)
+            return
+
+        try:
+            acl = await self.app.backend.get_object_acl(self.bucket, self.s3_object.key)
+        except botocore.exceptions.ClientError as e:
+            # e.g. if ACLs are disabled for the bucket or the user isn't allowed to read them
+            acl = e.response["Error"]["Message"]
+
+        cache[cache_key] = (self.s3_object.etag, head, acl)
+        self.show_details(head, acl)
+
+    def show_details(self, head: typing.Union[dict, str, None], acl: typing.Union[dict, str, None]) -> None:
+        """Render the object's details. head and acl are None while loading, or an error message if they failed."""
+        table = rich.table.Table(show_header=False, box=None)
+        table.add_column(style="bold")
+        table.add_column()
+
+        s3_object = self.s3_object
+        table.add_row("Key", f"{self.bucket}/{s3_object.key}")
+        table.add_row("Size", format_size(s3_object.size))
+        if s3_object.last_modified:
+            table.add_row("Last Modified", s3_object.last_modified.strftime("%Y-%m-%d %H:%M:%S"))
+        table.add_row("Storage Class", s3_object.storage_class or "")
+        table.add_row("ETag", s3_object.etag or "")
+
+        if head is None or isinstance(head, str):
+            table.add_row("", head or "Loading metadata and ACL...")
+            self.query_one("#details", textual.widgets.Static).update(table)
+            return
+
+        for field in ("ContentType", "CacheControl", "ContentEncoding", "ContentDisposition", "ServerSideEncryption", "VersionId"):
+            if head.get(field):
+                table.add_row(field, str(head[field]))
+        for key, value in head.get("Metadata", {}).items():
+            table.add_row(f"Metadata {key}", value)
+
+        if isinstance(acl, str):
+            table.add_row("ACL", acl)
+        else:
+            table.add_row("Owner", acl["Owner"].get("DisplayName", acl["Owner"].get("ID", "")))
+            for grant in acl.get("Grants", []):
+                grantee = grant["Grantee"]
+                name = grantee.get("DisplayName") or grantee.get("URI") or grantee.get("ID") or grantee.get("EmailAddress")
+                table.add_row("Grant", f"{grant['Permission']} for {name}")
+
+        self.query_one("#details", textual.widgets.Static).update(table)
+
+    def action_close(self) -> None:
+        self.dismiss()
+
+
+class EditObjectsScreen(textual.screen.ModalScreen[ObjectChanges]):
+    """A screen that asks for the storage class, ACL, content type and metadata to set on S3 objects."""
+
+    BINDINGS = [
+        textual.binding.Binding("escape", "cancel", "Cancel", show=False),
+    ]
+
+    CSS = """
+    EditObjectsScreen {
+        align: center middle;
+    }
+
+    #dialog {
+        padding: 0 1;
+        width: 60%;
+        height: auto;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #prompt {
+        width: 1fr;
+        text-align: center;
+    }
+
+    #buttons {
+        height: auto;
+    }
+
+    Button {
+        width: 1fr;
+    }
+    """
+
+    def __init__(self, *args, prompt: str, **kwargs):
+        self.prompt = prompt
+        super().__init__(*args, **kwargs)
+
+    def compose(self) -> textual.app.ComposeResult:
+        yield textual.containers.Vertical(
+            textual.widgets.Label(self.prompt, id="prompt"),
+            textual.widgets.Label("Storage class"),
+            textual.widgets.Select([(name, name) for name in STORAGE_CLASSES], prompt="Unchanged", id="storage_class"),
+            textual.widgets.Label("ACL"),
+            textual.widgets.Select([(name, name) for name in CANNED_ACLS], prompt="Unchanged", id="acl"),
+            textual.widgets.Label("Content type"),
+            textual.widgets.Input(placeholder="Unchanged", id="content_type"),
+            textual.widgets.Label("Metadata (added to the existing metadata)"),
+            textual.widgets.Input(placeholder="key=value, key2=value2", id="metadata"),
+            textual.containers.Horizontal(
+                textual.widgets.Button("Cancel", variant="error", id="cancel"),
+                textual.widgets.Button("Apply", variant="success", id="apply"),
+                id="buttons",
+            ),
+            id="dialog",
+        )
+
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+    def on_button_pressed(self, event: textual.widgets.Button.Pressed) -> None:
+        if event.button.id != "apply":
+            self.dismiss(None)
+            return
+
+        try:
+            metadata = parse_metadata(self.query_one("#metadata", textual.widgets.Input).value)
+        except ValueError as e:
+            self.notify(str(e), title="Error", severity="error")
+            return
+
+        changes = ObjectChanges(
+            storage_class=self.query_one("#storage_class", textual.widgets.Select).value,
+            acl=self.query_one("#acl", textual.widgets.Select).value,
+            content_type=self.query_one("#content_type", textual.widgets.Input).value.strip() or None,
+            metadata=metadata,
+        )
+        if not changes.requires_copy and not changes.acl:
+            self.notify("Nothing to change", title="Error", severity="error")
+            return
+
+        self.dismiss(changes)
+
+
+class ProgressScreen(textual.screen.ModalScreen[None]):
+    """A screen that shows the progress of a long running operation.
+
+    Hiding the screen doesn't stop the operation, it continues in the background.
+    """
+
+    BINDINGS = [
+        textual.binding.Binding("escape", "hide", "Hide", show=False),
+    ]
+
+    CSS = """
+    ProgressScreen {
+        align: center middle;
+    }
+
+    #dialog {
+        padding: 1 2;
+        width: auto;
+        height: auto;
+        border: thick $background 80%;
+        background: $surface;
+    }
+
+    #prompt {
+        width: auto;
+        margin-bottom: 1;
+    }
+
+    #hint {
+        width: auto;
+        margin-top: 1;
+        color: $text-muted;
+    }
+    """
+
+    def __init__(self, *args, prompt: str, **kwargs):
+        self.prompt = prompt
+        self.done = 0
+        self.total = None
+        super().__init__(*args, **kwargs)
+
+    def compose(self) -> textual.app.ComposeResult:
+        yield textual.containers.Vertical(
+            textual.widgets.Label(self.prompt, id="prompt"),
+            textual.widgets.ProgressBar(id="progress", show_eta=True),
+            textual.widgets.Label("Press escape to continue in the background.", id="hint"),
+            id="dialog",
+        )
+
+    def action_hide(self) -> None:
+        self.dismiss()
+
+    def on_mount(self) -> None:
+        self.set_interval(0.2, self.refresh_progress)
+
+    def update_progress(self, done: int, total: int) -> None:
+        """Set the number of finished and total steps. Can be called from any thread."""
+        self.done, self.total = done, total
+
+    def refresh_progress(self) -> None:
+        self.query_one("#progress", textual.widgets.ProgressBar).update(total=self.total, progress=self.done)
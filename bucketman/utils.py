@@ -0,0 +1,75 @@
+import collections
+import os
+import shlex
+import typing
+import urllib.parse
+
+
+def format_size(size: float) -> str:
+    """Return the given number of bytes in a human readable format, e.g. 1.5 MiB."""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(size) < 1024 or unit == "TiB":
+            break
+        size /= 1024
+
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def parse_pasted_paths(text: str) -> typing.List[str]:
+    """Return the local paths contained in pasted text or a file drop.
+
+    Paths can be separated by newlines, or by spaces if they are shell-quoted like terminals do for dropped files.
+    file:// URIs are converted to paths.
+    """
+    paths = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if os.path.exists(os.path.expanduser(line)):
+            candidates = [line]
+        else:
+            try:
+                candidates = shlex.split(line)
+            except ValueError:
+                candidates = [line]
+
+        for candidate in candidates:
+            if candidate.startswith("file://"):
+                candidate = urllib.parse.unquote(urllib.parse.urlparse(candidate).path)
+            paths.append(os.path.expanduser(candidate))
+
+    return paths
+
+
+def parse_metadata(text: str) -> typing.Dict[str, str]:
+    """Parse comma separated key=value pairs, e.g. "owner=team-a, env=prod", into a dict."""
+    metadata = {}
+    for pair in text.split(","):
+        if not pair.strip():
+            continue
+        key, sep, value = pair.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f'Invalid metadata entry "{pair.strip()}", expected key=value')
+        metadata[key.strip()] = value.strip()
+    return metadata
+
+
+class LRUCache(collections.OrderedDict):
+    """A dict that holds at most maxsize entries and drops the least recently used entry when full."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        super().__init__()
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
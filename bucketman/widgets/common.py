@@ -1,6 +1,141 @@
+from __future__ import annotations
 import enum
+import fnmatch
+import re
+import typing
+
+from rich.text import Text
+import textual.binding
+import textual.widgets
+from textual.widgets._tree import TreeNode
+
+from bucketman.constants import MARKED_STYLE
+from bucketman.modals import PatternInputScreen
 
 
 class ObjectType(enum.Enum):
     FILE = 0
     FOLDER = 1
+
+
+class MarkableTreeMixin:
+    """Mixin that allows marking multiple nodes of a Tree, by keystroke or by glob/regex pattern.
+
+    Marks are stored as a mapping of mark ID to node data, so they survive collapsing or reloading a node.
+    Subclasses need to implement `get_mark_id`.
+    """
+
+    MARK_BINDINGS = [
+        textual.binding.Binding("m", "mark", "Mark", show=True),
+        textual.binding.Binding("M", "mark_pattern", "Mark Pattern", show=True, key_display="Shift+m"),
+        textual.binding.Binding("c", "clear_marks", "Clear Marks", show=True),
+    ]
+
+    def __init__(self, *args, **kwargs):
+        self._marked: typing.Dict[typing.Hashable, typing.Any] = {}
+        super().__init__(*args, **kwargs)
+
+    def get_mark_id(self, node: TreeNode) -> typing.Hashable:
+        """Return the ID used to identify the given node when marking it, e.g. its key or path."""
+        raise NotImplementedError
+
+    @property
+    def marked(self) -> list:
+        """Return the data of all marked nodes."""
+        return list(self._marked.values())
+
+    def is_marked(self, node: TreeNode) -> bool:
+        return node.data is not None and self.get_mark_id(node) in self._marked
+
+    def toggle_mark(self, node: TreeNode) -> None:
+        """Mark the given node or unmark it if it's already marked. The root node can't be marked."""
+        if node.is_root:
+            return
+
+        mark_id = self.get_mark_id(node)
+        if mark_id in self._marked:
+            del self._marked[mark_id]
+        else:
+            self._marked[mark_id] = node.data
+        self._invalidate()
+
+    def mark_matching(self, pattern: str, parent: TreeNode) -> int:
+        """Mark all children of the given node whose name matches the pattern.
+
+        The pattern is interpreted as glob, or as regular expression if it's enclosed in slashes, e.g. /^log-\\d+/.
+        Return the number of newly marked nodes.
+        """
+        if len(pattern) > 1 and pattern.startswith("/") and pattern.endswith("/"):
+            matches = re.compile(pattern[1:-1]).search
+        else:
+            # globs have to match the whole name, e.g. "log*" must not match "catalog.txt"
+            matches = re.compile(fnmatch.translate(pattern)).fullmatch
+
+        count = 0
+        for child in parent.children:
+            name = str(child.label).rstrip("/")
+            mark_id = self.get_mark_id(child)
+            if matches(name) and mark_id not in self._marked:
+                self._marked[mark_id] = child.data
+                count += 1
+
+        self._invalidate()
+        return count
+
+    def clear_marks(self) -> None:
+        self._marked.clear()
+        self._invalidate()
+
+    def reload_parents(self, mark_ids: typing.Iterable[typing.Hashable]) -> None:
+        """Reload the parents of all loaded nodes with the given mark IDs, e.g. after deleting them.
+
+        Parents below another parent that is reloaded are skipped, as reloading a node replaces its children.
+        """
+        mark_ids = set(mark_ids)
+        parents = {}
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.children)
+            if not node.is_root and self.get_mark_id(node) in mark_ids:
+                parents[node.parent] = None
+
+        for parent in parents:
+            ancestor = parent.parent
+            while ancestor is not None and ancestor not in parents:
+                ancestor = ancestor.parent
+            if ancestor is None:
+                self.reload_node(parent)
+
+    def stylize_marked(self, node: TreeNode, text: Text) -> Text:
+        """Highlight the given label if the node is marked."""
+        if self.is_marked(node):
+            text.stylize(MARKED_STYLE)
+        return text
+
+    def action_mark(self) -> None:
+        """Toggle the mark of the cursor node and move the cursor to the next node."""
+        self.toggle_mark(self.cursor_node)
+        self.action_cursor_down()
+
+    def action_mark_pattern(self) -> None:
+        """Ask for a pattern and mark all matching nodes in the directory/prefix of the cursor node."""
+        node = self.cursor_node
+        parent = node if node.allow_expand else node.parent
+
+        def mark_pattern(pattern: str) -> None:
+            if not pattern:
+                return
+
+            try:
+                count = self.mark_matching(pattern, parent)
+            except re.error as e:
+                self.notify(f'Invalid pattern "{pattern}": {e}', title="Error", severity="error")
+            else:
+                self.notify(f'Marked {count} object(s) matching "{pattern}"')
+
+        self.app.push_screen(PatternInputScreen(), mark_pattern)
+
+    def action_clear_marks(self) -> None:
+        self.clear_marks()
+        self.notify("Cleared all marks")
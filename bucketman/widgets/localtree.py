@@ -4,22 +4,34 @@ import enum
 import functools
 import os
 
+from rich.style import Style
+from rich.text import Text
 import textual.widgets
 import textual.widgets.tree
 import textual.reactive
+from textual.widgets._tree import TreeNode
+from textual.widgets._directory_tree import DirEntry
 
-class LocalTree(textual.widgets.DirectoryTree):
+from bucketman.widgets.common import MarkableTreeMixin
+
+class LocalTree(MarkableTreeMixin, textual.widgets.DirectoryTree):
     name = "LocalTree"
     BINDINGS = [
         textual.binding.Binding("r", "reload", "Reload", show=True),
         textual.binding.Binding("u", "upload", "Upload", show=True),
         textual.binding.Binding("D", "local_delete", "Delete", show=True, key_display="Shift+d"),
-    ]
+    ] + MarkableTreeMixin.MARK_BINDINGS
 
     @property
     def selected_object(self):
         return self.cursor_node.data
 
+    def get_mark_id(self, node: TreeNode[DirEntry]):
+        return node.data.path
+
+    def render_label(self, node: TreeNode[DirEntry], base_style: Style, style: Style) -> Text:
+        return self.stylize_marked(node, super().render_label(node, base_style, style))
+
     def reload_parent_of_selected_node(self):
         """Reload the parent of the cursor node."""
         self.reload_node(
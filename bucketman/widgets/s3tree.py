@@ -1,5 +1,8 @@
 from __future__ import annotations
 import dataclasses
+import datetime
+import os
+import typing
 
 import botocore.exceptions
 from rich.style import Style
@@ -13,7 +16,8 @@ import rich.text
 from textual.widgets._tree import TreeNode
 
 from bucketman.constants import AWS_HEX_COLOR_CODE
-from bucketman.widgets.common import ObjectType
+from bucketman.utils import parse_pasted_paths
+from bucketman.widgets.common import MarkableTreeMixin, ObjectType
 
 
 @dataclasses.dataclass
@@ -22,20 +26,26 @@ class S3Object:
     size: float
     type: ObjectType
     loaded: bool = False
+    last_modified: datetime.datetime = None
+    storage_class: str = None
+    etag: str = None
 
     @property
     def is_dir(self):
         return self.type == ObjectType.FOLDER
 
 
-class S3Tree(textual.widgets.Tree[S3Object]):
+class S3Tree(MarkableTreeMixin, textual.widgets.Tree[S3Object]):
     name = "S3Tree"
     BINDINGS = [
         textual.binding.Binding("r", "reload", "Reload", show=True),
         textual.binding.Binding("d", "download", "Download", show=True, key_display='d'),
         textual.binding.Binding("D", "s3_delete", "Delete", show=True, key_display="Shift+d"),
+        textual.binding.Binding("v", "show_versions", "Versions", show=True),
+        textual.binding.Binding("i", "show_details", "Details", show=True),
+        textual.binding.Binding("e", "edit_objects", "Edit", show=True),
         textual.binding.Binding("b", "select_bucket", "Select Bucket", show=True),
-    ]
+    ] + MarkableTreeMixin.MARK_BINDINGS
 
     def __init__(self, bucket_name: str, *args, **kwargs):
         self.bucket_name = bucket_name
@@ -48,22 +58,30 @@ class S3Tree(textual.widgets.Tree[S3Object]):
     def selected_object(self) -> S3Object:
         return self.cursor_node.data
 
+    def get_mark_id(self, node: TreeNode[S3Object]) -> str:
+        return node.data.key
+
     async def on_mount(self) -> None:
         self.load_objects(self.root)
 
     def on_paste(self, event: textual.events.Paste) -> None:
-        """Handle pasting a path from the clipboard or file drop."""
-        # TODO support pasting multiple paths without erroring
-        paths = event.text.splitlines()
+        """Upload the paths pasted from the clipboard or dropped onto the terminal to the selected prefix."""
+        paths = parse_pasted_paths(event.text)
+        missing = [path for path in paths if not os.path.exists(path)]
+        paths = [path for path in paths if os.path.exists(path)]
+
+        for path in missing:
+            self.notify(f'Can\'t upload "{path}" as it does not exist', title="Error", severity="error")
 
-        for path in paths:
-            self.log(f"Would upload {path}")
-            #self.app.action_upload(path.strip())
+        if paths:
+            self.app.action_upload(paths)
 
     def reload_node(self, node: TreeNode[S3Object]):
         """Reload the given node. If the node is a file or a prefix with no children, reload the parent."""
         node.remove_children()
-        self.load_objects(node)
+        self.load_objects(node, self._expand_or_reload_parent)
+
+    def _expand_or_reload_parent(self, node: TreeNode[S3Object]):
         if not node.children and self.root != node:
             self.reload_node(node.parent)
         else:
@@ -97,58 +115,59 @@ class S3Tree(textual.widgets.Tree[S3Object]):
             prefix = ("📄 ", base_style)
 
         text = Text.assemble(prefix, node_label)
-        return text
+        return self.stylize_marked(node, text)
 
-    def load_objects(self, node: textual.widgets.TreeNode[S3Object]):
+    def load_objects(self, node: textual.widgets.TreeNode[S3Object], on_loaded: typing.Callable[[TreeNode[S3Object]], None] = None):
+        """Load the prefixes and objects below the given node in the background and call on_loaded afterwards."""
         if node is None:
             node = self.root
 
-        prefix = node.data.key
+        self.run_worker(self.do_load_objects(node, on_loaded), group=f"load-{node.id}", exclusive=True)
 
-        paginator = self.app.s3_client.get_paginator("list_objects_v2")
-        result = paginator.paginate(
-            Bucket=self.bucket_name, Delimiter="/", Prefix=prefix
-        )
+    async def do_load_objects(self, node: textual.widgets.TreeNode[S3Object], on_loaded: typing.Callable[[TreeNode[S3Object]], None] = None):
+        prefix = node.data.key
 
         try:
-            for common_prefix in result.search("CommonPrefixes"):
-                if not common_prefix:
-                    continue
-                key = common_prefix.get("Prefix")
-                node.add(
-                    key.replace(prefix, "", 1), S3Object(key, 0, ObjectType.FOLDER)
-                )
-
-            for obj in result.search("Contents"):
-                if not obj:
-                    continue
-                key = obj.get("Key")
-                node.add(
-                    key.replace(prefix, "", 1),
-                    S3Object(key, obj.get("Size"), ObjectType.FILE),
-                    allow_expand=False
-                )
-
+            prefixes, objects = await self.app.backend.list_prefix(self.bucket_name, prefix)
         except botocore.exceptions.ClientError:
             self.notify(
                 f'Failed to load contents of bucket "{self.bucket_name}". Please check your credentials and make sure the bucket exists and you have permission to access it.',
                 title="Error",
                 severity="error"
             )
-            self.app.action_change_bucket()
-            #self.app.panic(
-            #    f'Failed to load contents of bucket "{self.bucket_name}". Please check your credentials and make sure the bucket exists and you have permission to access it.'
-            #)
+            self.app.action_select_bucket()
+            return
+
+        for key in prefixes:
+            node.add(
+                key.replace(prefix, "", 1), S3Object(key, 0, ObjectType.FOLDER)
+            )
+
+        for obj in objects:
+            key = obj.get("Key")
+            node.add(
+                key.replace(prefix, "", 1),
+                S3Object(
+                    key,
+                    obj.get("Size"),
+                    ObjectType.FILE,
+                    last_modified=obj.get("LastModified"),
+                    storage_class=obj.get("StorageClass"),
+                    etag=obj.get("ETag"),
+                ),
+                allow_expand=False
+            )
 
         node.data.loaded = True
+        if on_loaded:
+            on_loaded(node)
 
     def load_and_toggle_selected_node(self):
         node = self.cursor_node
-        if node.data.is_dir:
-            if not node.data.loaded:
-                self.load_objects(node)
-
-        node.toggle()
+        if node.data.is_dir and not node.data.loaded:
+            self.load_objects(node, lambda loaded_node: loaded_node.toggle())
+        else:
+            node.toggle()
 
     def action_toggle_node(self):
         self.load_and_toggle_selected_node()
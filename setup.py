@@ -17,7 +17,10 @@ setup(
         "click==8.1.7",
         "textual==0.38.1",
     ],
-    extras_require={"dev": {"autopep8", "pylint", "keepachangelog", "wheel"}},
+    extras_require={
+        "dev": {"autopep8", "pylint", "keepachangelog", "wheel"},
+        "async": {"aiobotocore==2.7.0"},
+    },
     include_package_data=True,
     entry_points="""
         [console_scripts]
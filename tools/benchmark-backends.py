@@ -0,0 +1,61 @@
+"""Compare the threaded and async backends by uploading, listing, downloading and deleting many tiny objects.
+
+Usage: python tools/benchmark-backends.py BUCKET [COUNT] [ENDPOINT_URL]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import boto3
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from bucketman.backends import AsyncBackend, ThreadedBackend
+from bucketman.widgets.common import ObjectType
+from bucketman.widgets.s3tree import S3Object
+
+bucket = sys.argv[1]
+count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+endpoint_url = sys.argv[3] if len(sys.argv) > 3 else None
+
+
+async def benchmark(name, backend):
+    prefix = f"bucketman-benchmark-{name}/"
+
+    with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as target:
+        uploads = []
+        for i in range(count):
+            path = os.path.join(source, f"{i}.txt")
+            with open(path, "w") as f:
+                f.write(str(i))
+            uploads.append((path, f"{prefix}{i}.txt"))
+
+        timings = {}
+        start = time.perf_counter()
+        failures = await backend.upload_files(bucket, uploads)
+        timings["upload"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, objects = await backend.list_prefix(bucket, prefix)
+        timings["list"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        downloads = await backend.list_download_targets(bucket, [S3Object(prefix, 0, ObjectType.FOLDER)], target)
+        failures += await backend.download_files(bucket, downloads)
+        timings["download"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        deleted, errors = await backend.delete(bucket, [S3Object(prefix, 0, ObjectType.FOLDER)])
+        timings["delete"] = time.perf_counter() - start
+
+    await backend.close()
+
+    print(f"{name} backend ({count} objects, {len(objects)} listed, {len(failures) + len(errors)} failed):")
+    for operation, seconds in timings.items():
+        print(f"  {operation:<10}{seconds:8.2f}s")
+
+
+s3_client = boto3.client("s3", endpoint_url=endpoint_url)
+asyncio.run(benchmark("threaded", ThreadedBackend(s3_client)))
+asyncio.run(benchmark("async", AsyncBackend(endpoint_url=endpoint_url)))